@@ -0,0 +1,311 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline benchmark for the download path. A local stand-in for kemono/coomer serves the
+# creators.txt, profile, post listing and /data endpoints; each worker count is then run
+# in a fresh subprocess through the real DownloadEngine so RSS and CPU figures are per run.
+
+# Mock server defaults
+DEFAULT_CREATORS = 2
+DEFAULT_POSTS = 100
+DEFAULT_MEDIAN_KB = 256
+DEFAULT_SIGMA = 1.0
+DEFAULT_CATALOGUE_SIZE = 50000
+DEFAULT_WORKER_COUNTS = "1,4,16,32"
+SERVICE = "patreon"
+SEND_CHUNK = 64 * 1024
+
+def parse_size_dist(value):
+    # "lognormal:MEDIAN_KB:SIGMA" or "fixed:KB"
+    parts = value.split(":")
+    if parts[0] == "fixed" and len(parts) == 2:
+        return ("fixed", float(parts[1]) * 1024, 0.0)
+    if parts[0] == "lognormal" and len(parts) == 3:
+        return ("lognormal", float(parts[1]) * 1024, float(parts[2]))
+    raise argparse.ArgumentTypeError(f"invalid size distribution: {value}")
+
+def build_dataset(creators, posts, size_dist, catalogue_size, seed):
+    # Returns (files by hash, post pages by creator id, creators.txt entries).
+    # File bodies are seeded random bytes whose SHA-256 matches their data path.
+    rng = random.Random(seed)
+    kind, median, sigma = size_dist
+    files = {}
+    listings = {}
+    for c in range(creators):
+        creator_posts = []
+        for p in range(posts):
+            size = int(median if kind == "fixed" else rng.lognormvariate(0, sigma) * median)
+            body = rng.randbytes(max(1, size))
+            digest = hashlib.sha256(body).hexdigest()
+            files[digest] = body
+            ext = rng.choice([".jpg", ".png", ".mp4", ".zip"])
+            creator_posts.append({
+                "id": str(100000 + c * posts + p),
+                "published": "2024-01-01T00:00:00",
+                "file": {"path": f"/{digest[:2]}/{digest[2:4]}/{digest}{ext}"},
+                "attachments": [],
+            })
+        listings[str(c + 1)] = creator_posts
+    # Some names lowercase to more code points than they have ("İ" -> "i̇"), which the
+    # catalogue's offsets have to allow for
+    catalogue = [
+        {"id": str(i + 1), "name": f"{'İzmir ' if i % 7 == 0 else ''}creator{i}_{rng.getrandbits(32):08x}",
+         "service": SERVICE, "favorited": rng.randint(0, 10000)}
+        for i in range(max(catalogue_size, creators))
+    ]
+    return files, listings, catalogue
+
+class MockKemonoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the server instance: dataset, latency, bandwidth, error_rate, error_codes, posts_per_page
+    server_version = "MockKemono"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, headers=()):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        # Per-connection bandwidth cap
+        for start in range(0, len(body), SEND_CHUNK):
+            chunk = body[start:start + SEND_CHUNK]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        path, _, query = self.path.partition("?")
+        if path.startswith("/data/") and random.random() < server.error_rate:
+            status = random.choice(server.error_codes)
+            return self.send_body(status, b"", [("Retry-After", "1")] if status == 429 else [])
+
+        if path == "/api/v1/creators.txt":
+            return self.send_body(200, server.catalogue_body, [("Content-Type", "application/json")])
+        match = re.match(r"^/api/v1/(\w+)/user/(\w+)/profile$", path)
+        if match:
+            body = json.dumps({"id": match.group(2), "name": f"Creator {match.group(2)}", "service": match.group(1)})
+            return self.send_body(200, body.encode())
+        match = re.match(r"^/api/v1/(\w+)/user/(\w+)$", path)
+        if match:
+            offset = int(re.search(r"o=(\d+)", query).group(1)) if "o=" in query else 0
+            posts = server.listings.get(match.group(2), [])
+            page = posts[offset:offset + server.posts_per_page]
+            return self.send_body(200, json.dumps(page).encode(), [("Content-Type", "application/json")])
+        match = re.match(r"^/data/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})", path)
+        if match and match.group(1) in server.files:
+            body = server.files[match.group(1)]
+            range_header = self.headers.get("Range")
+            if range_header:
+                start, end = re.match(r"bytes=(\d+)-(\d*)", range_header).groups()
+                start = int(start)
+                end = min(int(end), len(body) - 1) if end else len(body) - 1
+                if start >= len(body):
+                    return self.send_body(416, b"", [("Content-Range", f"bytes */{len(body)}")])
+                return self.send_body(206, body[start:end + 1], [
+                    ("Accept-Ranges", "bytes"),
+                    ("Content-Range", f"bytes {start}-{end}/{len(body)}"),
+                ])
+            return self.send_body(200, body, [("Accept-Ranges", "bytes")])
+        self.send_body(404, b"")
+
+def start_mock_server(args):
+    files, listings, catalogue = build_dataset(args.creators, args.posts, args.size_dist, args.catalogue_size, args.seed)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), MockKemonoHandler)
+    server.daemon_threads = True
+    server.files = files
+    server.listings = listings
+    server.catalogue_body = json.dumps(catalogue).encode()
+    server.latency = args.latency_ms / 1000
+    server.bandwidth = args.bandwidth_kbps * 1024
+    server.error_rate = args.error_rate
+    server.error_codes = args.error_codes
+    server.posts_per_page = 50
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def check_catalogue(catalogue, terms):
+    # Compares the indexed search with a plain scan so a fast but wrong index can't pass
+    for term in terms:
+        expected = [row for row, name in enumerate(catalogue.names) if term in name.lower()]
+        if sorted(catalogue.search(term)) != expected:
+            raise SystemExit(f"catalogue search for {term!r} disagrees with a plain scan")
+
+def run_client(args):
+    # Runs inside a fresh subprocess: one full engine run against the mock server
+    import kemonoDrive
+
+    kemonoDrive.API_SCHEME = "http"
+    latencies = []
+    lock = threading.Lock()
+    counts = {"ok": 0, "skip": 0, "dedup": 0, "errors": 0, "retries": 0, "bytes": 0}
+
+    def record_latency(started):
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    class TimedEngine(kemonoDrive.DownloadEngine):
+        def download(self, url, save_dir, manifest):
+            # Fresh downloads return a Future that settles after verification, which is
+            # part of the file's latency
+            started = time.perf_counter()
+            try:
+                result = super().download(url, save_dir, manifest)
+            except kemonoDrive.Deferred:
+                # Requeued, not finished; the later attempt is timed on its own
+                raise
+            except Exception:
+                record_latency(started)
+                raise
+            if isinstance(result, kemonoDrive.Future):
+                result.add_done_callback(lambda future: record_latency(started))
+            else:
+                record_latency(started)
+            return result
+
+    def on_event(event, data):
+        with lock:
+            if event == "file_done":
+                counts[data["status"]] += 1
+                counts["bytes"] += data.get("size", 0)
+            elif event in ("file_error", "creator_error"):
+                counts["errors"] += 1
+            elif event == "retry":
+                counts["retries"] += 1
+
+    base = f"127.0.0.1:{args.port}"
+    urls = [f"http://{base}/{SERVICE}/user/{c + 1}" for c in range(args.creators)]
+    out = tempfile.mkdtemp(prefix="kemonodrive-bench-")
+    try:
+        engine = TimedEngine(out, workers=args.workers, segments=args.segments,
+                             segment_threshold=args.segment_threshold_mb * 1024 * 1024, sync=False, on_event=on_event)
+        cpu_start = os.times()
+        started = time.perf_counter()
+        engine.run(urls)
+        elapsed = time.perf_counter() - started
+        cpu_end = os.times()
+
+        # Catalogue path: fetch, parse, index and a few searches
+        catalogue_started = time.perf_counter()
+        creators = kemonoDrive.get_session().get(f"http://{base}/api/v1/creators.txt").json()
+        catalogue = kemonoDrive.CreatorCatalogue(creators)
+        for term in ("creator1", "abc", "a"):
+            catalogue.search(term)
+        catalogue_elapsed = time.perf_counter() - catalogue_started
+        check_catalogue(catalogue, ("creator1", "abc", "a", "i̇zmir", "9_"))
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    files = counts["ok"] + counts["skip"] + counts["dedup"]
+    hits, misses = kemonoDrive.session_pool_stats()
+    print(json.dumps({
+        "workers": args.workers,
+        "files": files,
+        "errors": counts["errors"],
+        "retries": counts["retries"],
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(files / elapsed, 2),
+        "mb_per_s": round(counts["bytes"] / elapsed / 1e6, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": round(rss_mb, 1),
+        # Includes the verification worker processes, which are reaped when the run ends
+        "cpu_s": round(sum(getattr(cpu_end, f) - getattr(cpu_start, f) for f in ("user", "system", "children_user", "children_system")), 2),
+        "pool_hits": hits,
+        "pool_misses": misses,
+        "catalogue_ms": round(catalogue_elapsed * 1000, 1),
+    }))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline KemonoDrive download benchmark against a local mock server.")
+    parser.add_argument("--workers", default=DEFAULT_WORKER_COUNTS, help=f"comma-separated worker counts (default: {DEFAULT_WORKER_COUNTS})")
+    parser.add_argument("--creators", type=int, default=DEFAULT_CREATORS, help=f"creators to sync (default: {DEFAULT_CREATORS})")
+    parser.add_argument("--posts", type=int, default=DEFAULT_POSTS, help=f"posts per creator, one file each (default: {DEFAULT_POSTS})")
+    parser.add_argument("--size-dist", type=parse_size_dist, default=("lognormal", DEFAULT_MEDIAN_KB * 1024, DEFAULT_SIGMA),
+                        help=f"file sizes: lognormal:MEDIAN_KB:SIGMA or fixed:KB (default: lognormal:{DEFAULT_MEDIAN_KB}:{DEFAULT_SIGMA})")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added before every response")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="per-connection cap in KiB/s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of /data requests answered with an error")
+    parser.add_argument("--error-codes", type=lambda v: [int(c) for c in v.split(",")], default=[429, 503],
+                        help="status codes used for injected errors (default: 429,503)")
+    parser.add_argument("--segments", type=int, default=4, help="segments per large file (default: 4)")
+    parser.add_argument("--segment-threshold-mb", type=int, default=50, help="segment files larger than this (default: 50)")
+    parser.add_argument("--catalogue-size", type=int, default=DEFAULT_CATALOGUE_SIZE, help="entries in the mock creators.txt")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.client:
+        args.workers = int(args.workers)
+        run_client(args)
+        return 0
+
+    server = start_mock_server(args)
+    port = server.server_address[1]
+    total_mb = sum(len(body) for body in server.files.values()) / 1e6
+    print(f"Mock server on 127.0.0.1:{port}: {len(server.files)} files, {total_mb:.1f} MB", file=sys.stderr)
+
+    results = []
+    forwarded = [
+        "--creators", str(args.creators), "--posts", str(args.posts), "--segments", str(args.segments),
+        "--segment-threshold-mb", str(args.segment_threshold_mb), "--port", str(port),
+    ]
+    for workers in [int(w) for w in args.workers.split(",")]:
+        cmd = [sys.executable, os.path.abspath(__file__), "--client", "--workers", str(workers)] + forwarded
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            return proc.returncode
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        print(f"workers={workers} done", file=sys.stderr)
+    server.shutdown()
+
+    columns = ["workers", "files", "errors", "retries", "seconds", "files_per_s", "mb_per_s",
+               "p50_ms", "p99_ms", "peak_rss_mb", "cpu_s", "pool_hits", "pool_misses", "catalogue_ms"]
+    print("  ".join(f"{c:>12}" for c in columns))
+    for result in results:
+        print("  ".join(f"{result[c]:>12}" for c in columns))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,16 +2,39 @@ import os
 import re
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import threading
+import queue
 import subprocess
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
 from urllib.parse import urlparse
-from tkinter import filedialog, messagebox, ttk
-import tkinter as tk
 import webbrowser
 import base64
+import json
+import shutil
+import sqlite3
+import hashlib
+import zipfile
+import time
+import random
+from email.utils import parsedate_to_datetime
+from array import array
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# PIL and cv2 for image/video preview
-from PIL import Image, ImageTk
+# Tk and PIL are only needed by the GUI; the headless engine runs without them
+try:
+    from tkinter import filedialog, messagebox, ttk
+    import tkinter as tk
+    # PIL and cv2 for image/video preview
+    from PIL import Image, ImageTk
+except ImportError:
+    tk = None
 import io
 try:
     import cv2
@@ -24,6 +47,191 @@ DEFAULT_WORKERS = 5
 MIN_WORKERS = 1
 MAX_WORKERS = 100
 
+# Segmented download constants
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENTS = 1
+MAX_SEGMENTS = 16
+DEFAULT_SEGMENT_THRESHOLD_MB = 50
+
+# Post listing constants
+POSTS_PER_PAGE = 50
+PAGE_PREFETCH = 3
+# Creators listed at once; a re-sync with nothing new costs each of them one page request
+CREATOR_LISTERS = 4
+# Files queued per worker before listing waits for downloads to catch up
+QUEUE_PER_WORKER = 4
+
+# Scheduler constants
+# Seconds a host's limit must stay saturated before it is raised by one again
+ADAPT_WINDOW = 5.0
+# Connections (jobs plus their extra segments) one host is given at once, whatever the settings
+HOST_MAX_CONNECTIONS = 64
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 120.0
+# Seconds before a file whose content another worker is fetching is looked up again
+DEDUP_RECHECK_DELAY = 1.0
+
+# HTTP session constants
+USER_AGENT = "Mozilla/5.0"
+# Scheme for API and data requests; benchmark.py points this at its plain-HTTP mock server
+API_SCHEME = "https"
+# Distinct hosts (front domains and data nodes) kept in the pool manager
+POOL_HOSTS = 32
+# (connect, read) seconds; the read timeout is the longest silence allowed mid-transfer
+REQUEST_TIMEOUT = (10, 30)
+
+# Data node mirror constants
+# Other nodes tried within one download attempt before the scheduler's backoff takes over
+MIRROR_FAILOVERS = 2
+# Seconds a failing node is skipped, doubled per consecutive failure up to the maximum
+MIRROR_COOLDOWN = 30.0
+MIRROR_MAX_COOLDOWN = 600.0
+# Weight of the newest sample in a node's latency and throughput averages
+MIRROR_EWMA = 0.3
+# Nodes are ranked by the expected time to fetch a file of this size
+MIRROR_REFERENCE_SIZE = 4 * 1024 * 1024
+# Every Nth download per front domain goes through the front's redirect instead of a known
+# node, so nodes that weren't hit by the first burst are still discovered and measured
+MIRROR_PROBE_EVERY = 20
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+# (requests, connections) carried over from adapters replaced by a resize
+_retired_pool_stats = [0, 0]
+# Called with (host, seconds) for every new connection while a run is collecting metrics
+_connect_observer = None
+
+# File transfer constants
+CHUNK_SIZE = 8192
+PART_SUFFIX = ".part"
+# Sidecar next to a segmented .part file recording which ranges are finished
+SEGMENTS_SUFFIX = ".segments"
+
+# Local state kept inside the output folder
+STATE_DIR_NAME = ".kemonodrive"
+HASH_INDEX_NAME = "hashes.sqlite3"
+MANIFEST_DIR_NAME = "manifests"
+
+# Verification stage constants
+# Processes hashing finished files (and unpacking archives) so download threads never do CPU work
+VERIFY_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+VERIFY_CHUNK_SIZE = 1024 * 1024
+# Times a file whose bytes don't match the hash in its name is downloaded again
+VERIFY_RETRIES = 2
+# What happens to .zip files once verified: nothing, a "<name>.zip.txt" listing, or extraction
+ARCHIVE_MODES = ("keep", "list", "extract")
+
+# Per-user cache shared by every output folder
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".kemonodrive", "cache")
+# Seconds a loaded creators catalogue is trusted before it is revalidated with the server
+CATALOGUE_TTL = 60 * 60
+
+_catalogues = {}
+_catalogue_lock = threading.Lock()
+
+# Browse tab post count constants
+POST_COUNT_WORKERS = 8
+POST_COUNT_TTL = 10 * 60
+# A failed lookup shows "?" for this long before it is tried again
+POST_COUNT_FAILURE_TTL = 60
+# Rows below the visible ones whose counts are fetched ahead of scrolling
+POST_COUNT_LOOKAHEAD = 20
+# Pixel height of one row in the Browse result list
+RESULT_ROW_HEIGHT = 24
+
+# Preview thumbnail constants
+THUMBNAIL_SIZE = (200, 200)
+THUMBNAIL_DIR = os.path.join(CACHE_DIR, "thumbnails")
+PREVIEW_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+PREVIEW_VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov', '.avi', '.mkv')
+
+# UI event bus constants
+UI_FPS = 10
+UI_MAX_EVENTS_PER_FRAME = 5000
+LOG_MAX_LINES = 2000
+# Seconds of history behind the files/s and MB/s figures
+STATS_WINDOW = 10.0
+
+# Run metrics constants
+METRICS_STAGES = ("connect", "ttfb", "transfer", "disk_write", "verify", "post_process")
+# Upper bounds in seconds of the stage timing histogram buckets
+METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Seconds between rewrites of the Prometheus text file during a run
+METRICS_WRITE_INTERVAL = 15.0
+# Seconds between stack samples taken by the profiler
+PROFILE_INTERVAL = 0.005
+# (file, function) of innermost frames that mean a thread is waiting for work
+PROFILE_IDLE_FRAMES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+                       ("thread.py", "_worker"), ("selectors.py", "select")}
+# Kemono data paths are /data/ab/cd/<sha256>.ext, so the file name carries the content hash.
+# Exactly one extension, so files derived from a download (a "<sha256>.zip.txt" listing) never match
+CONTENT_HASH_RE = re.compile(r"^([0-9a-f]{64})(?:\.[^.]+)?$")
+
+class _TimedHTTPConnection(HTTPConnection):
+    # DNS lookup and TCP connect happen here, so this is the connect stage of a request
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if _connect_observer:
+            _connect_observer(self.host, time.perf_counter() - started)
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    # Same as above, with the TLS handshake included
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        if _connect_observer:
+            _connect_observer(self.host, time.perf_counter() - started)
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+def _adapter_pool_stats(adapter):
+    requests_made = connections = 0
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is not None:
+            requests_made += pool.num_requests
+            connections += pool.num_connections
+    return requests_made, connections
+
+def get_session(pool_size=None):
+    # One keep-alive session shared by every thread; the per-host pools only
+    # grow, so a smaller worker count later on keeps reusing the same sockets.
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = USER_AGENT
+        if pool_size and pool_size > _session_pool_size:
+            for adapter in set(_session.adapters.values()):
+                requests_made, connections = _adapter_pool_stats(adapter)
+                _retired_pool_stats[0] += requests_made
+                _retired_pool_stats[1] += connections
+            adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size)
+            adapter.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool, "https": _TimedHTTPSConnectionPool}
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session_pool_size = pool_size
+        return _session
+
+def session_pool_stats():
+    # Returns (hits, misses): requests served on a reused connection vs. new connections opened
+    with _session_lock:
+        requests_made, connections = _retired_pool_stats
+        if _session is not None:
+            for adapter in set(_session.adapters.values()):
+                r, c = _adapter_pool_stats(adapter)
+                requests_made += r
+                connections += c
+    return requests_made - connections, connections
+
 def sanitize_filename(name):
     return re.sub(r'[\\/*?:"<>|]', '_', name).strip()
 
@@ -49,7 +257,7 @@ def extract_domain_service_id(url):
 
 def get_creator_name(domain, service, creator_id):
     try:
-        r = requests.get(f"https://{domain}/api/v1/{service}/user/{creator_id}/profile")
+        r = get_session().get(f"{API_SCHEME}://{domain}/api/v1/{service}/user/{creator_id}/profile", timeout=REQUEST_TIMEOUT)
         if r.ok:
             data = r.json()
             return sanitize_filename(data.get("name") or creator_id)
@@ -57,47 +265,1436 @@ def get_creator_name(domain, service, creator_id):
         pass
     return creator_id
 
-def get_creator_posts(domain, service, creator_id):
-    r = requests.get(f"https://{domain}/api/v1/{service}/user/{creator_id}")
+def get_creator_posts(domain, service, creator_id, offset=0):
+    params = {"o": offset} if offset else None
+    r = get_session().get(f"{API_SCHEME}://{domain}/api/v1/{service}/user/{creator_id}", params=params, timeout=REQUEST_TIMEOUT)
     r.raise_for_status()
     return r.json()
 
-def download_file(url, save_dir, file_label, artist_bar, file_bar, log_box):
+def iter_creator_posts(domain, service, creator_id, prefetch=PAGE_PREFETCH, stop_at=None):
+    # Walks the ?o= offsets, keeping up to `prefetch` pages in flight while
+    # the caller consumes the posts of the current page. Listing ends at the
+    # first post for which `stop_at(post)` is true; in that case the first page
+    # is fetched alone, since a re-sync usually stops inside it.
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = deque()
+        next_offset = 0
+        in_flight = 1 if stop_at else prefetch
+        while True:
+            while len(pending) < in_flight:
+                pending.append(executor.submit(get_creator_posts, domain, service, creator_id, next_offset))
+                next_offset += POSTS_PER_PAGE
+            posts = pending.popleft().result()
+            stop = next((i for i, post in enumerate(posts) if stop_at and stop_at(post)), None)
+            yield from posts[:stop]
+            if stop is not None or len(posts) < POSTS_PER_PAGE:
+                break
+            in_flight = prefetch
+        for future in pending:
+            future.cancel()
+
+def iter_creator_files(domain, service, creator_id, manifest=None):
+    # With a manifest, listing stops at the newest post already synced (posts are listed newest first)
+    stop_at = manifest.is_known_post if manifest else None
+    for post in iter_creator_posts(domain, service, creator_id, stop_at=stop_at):
+        if manifest:
+            manifest.see_post(post)
+        for a in post.get("attachments", []):
+            if "path" in a:
+                yield f"{API_SCHEME}://{domain}/data{a['path']}"
+        if post.get("file") and "path" in post["file"]:
+            yield f"{API_SCHEME}://{domain}/data{post['file']['path']}"
+
+class IncompleteDownload(IOError):
+    # The server's response ended early or didn't line up with the requested range
+    pass
+
+def _parse_content_range(value):
+    # "bytes 100-199/1000" -> (100, 1000); "bytes */1000" -> (None, 1000)
+    match = re.match(r"bytes (?:(\d+)-\d+|\*)/(\d+|\*)", value or "")
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return (int(start) if start else None), (int(total) if total != "*" else None)
+
+def _save_segment_state(state_path, state):
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+def _fetch_segmented(url, part_path, total, segments, on_progress=None, metrics=None, slots=None):
+    # Fetches `segments` byte ranges concurrently into a preallocated part file.
+    # Finished ranges are recorded in a sidecar so a resumed run only refetches the rest.
+    # With `slots`, connections beyond the caller's own are borrowed from the host's
+    # limit, and ranges that get no connection of their own wait for one that finished.
+    state_path = part_path + SEGMENTS_SUFFIX
+    state = None
+    if os.path.exists(state_path) and os.path.exists(part_path):
+        with open(state_path) as f:
+            state = json.load(f)
+        if state.get("total") != total:
+            state = None
+    if state is None:
+        size = -(-total // segments)
+        ranges = [[start, min(start + size, total) - 1] for start in range(0, total, size)]
+        state = {"total": total, "ranges": ranges, "done": []}
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        _save_segment_state(state_path, state)
+
+    lock = threading.Lock()
+    ranges = state["ranges"]
+    downloaded = sum(ranges[i][1] - ranges[i][0] + 1 for i in state["done"])
+
+    def fetch_segment(index):
+        nonlocal downloaded
+        start, end = ranges[index]
+        headers = {"Accept-Encoding": "identity", "Range": f"bytes={start}-{end}"}
+        written = 0
+        with get_session().get(url, stream=True, headers=headers, timeout=REQUEST_TIMEOUT) as r:
+            if metrics:
+                metrics.observe("ttfb", r.elapsed.total_seconds())
+            r.raise_for_status()
+            got_start, got_total = _parse_content_range(r.headers.get("content-range"))
+            if r.status_code != 206 or got_start != start or got_total != total:
+                raise IncompleteDownload(f"segment {index} got an unexpected range response")
+            transfer_started = time.perf_counter()
+            disk_time = 0.0
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    chunk = chunk[:end - start + 1 - written]
+                    write_started = time.perf_counter()
+                    f.write(chunk)
+                    disk_time += time.perf_counter() - write_started
+                    written += len(chunk)
+                    with lock:
+                        downloaded += len(chunk)
+                        done = downloaded
+                    if on_progress:
+                        on_progress(int(done * 100 / total))
+            if metrics:
+                metrics.observe_transfer(urlparse(url).netloc, time.perf_counter() - transfer_started - disk_time, disk_time, written)
+        if written != end - start + 1:
+            raise IncompleteDownload(f"segment {index} incomplete ({written} of {end - start + 1} bytes)")
+        with lock:
+            state["done"].append(index)
+            _save_segment_state(state_path, state)
+
+    pending = [i for i in range(len(ranges)) if i not in state["done"]]
+    if pending:
+        extra = slots.reserve(len(pending) - 1) if slots else len(pending) - 1
+        try:
+            with ThreadPoolExecutor(max_workers=1 + extra) as executor:
+                # list() re-raises the first failed segment
+                list(executor.map(fetch_segment, pending))
+        finally:
+            if slots:
+                slots.release(extra)
+    os.remove(state_path)
+
+def fetch_to_file(url, path, on_progress=None, segments=1, segment_threshold=0, metrics=None, on_response=None, slots=None,
+                  keep_part=False):
+    # Streams into `path + .part`, resuming an existing part file with a Range
+    # request, and only renames it into place once the byte count matches. With
+    # `keep_part` the complete part file is left for the caller to check and rename.
+    # Files of at least `segment_threshold` bytes are split into `segments`
+    # concurrent ranges when the server supports them. Stage timings and bytes
+    # go to `metrics` (a RunMetrics) when one is given; `on_response(r)` sees the
+    # first response, after redirects, before its body is read. `slots` is passed on
+    # to _fetch_segmented.
+    part_path = path + PART_SUFFIX
+    state_path = part_path + SEGMENTS_SUFFIX
+    if os.path.exists(state_path) and os.path.exists(part_path):
+        with open(state_path) as f:
+            total = json.load(f)["total"]
+        _fetch_segmented(url, part_path, total, segments, on_progress, metrics, slots)
+        if not keep_part:
+            os.replace(part_path, path)
+        return
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    # Ranges must address the raw bytes, so ask for no transfer encoding
+    headers = {"Accept-Encoding": "identity"}
+    if offset or segments > 1:
+        # An open-ended range from 0 doubles as the probe for range support
+        headers["Range"] = f"bytes={offset}-"
+    with get_session().get(url, stream=True, headers=headers, timeout=REQUEST_TIMEOUT) as r:
+        if metrics:
+            metrics.observe("ttfb", r.elapsed.total_seconds())
+        if on_response:
+            on_response(r)
+        if offset and r.status_code == 416:
+            _, total = _parse_content_range(r.headers.get("content-range"))
+            if total == offset:
+                if not keep_part:
+                    os.replace(part_path, path)
+                return
+            # The part file doesn't match what the server has; start over
+            os.remove(part_path)
+            return fetch_to_file(url, path, on_progress, segments, segment_threshold, metrics, on_response, slots, keep_part)
+        r.raise_for_status()
+        if r.status_code == 206:
+            start, total = _parse_content_range(r.headers.get("content-range"))
+            if start != offset:
+                raise IncompleteDownload(f"server resumed at byte {start}, expected {offset}")
+            if not offset and segments > 1 and total and total >= segment_threshold:
+                r.close()
+                # Segments go straight to the node the probe was redirected to
+                _fetch_segmented(r.url, part_path, total, segments, on_progress, metrics, slots)
+                if not keep_part:
+                    os.replace(part_path, path)
+                return
+            mode = "ab" if offset else "wb"
+        else:
+            # Server ignored the Range header, so the body is the whole file
+            offset = 0
+            mode = "wb"
+            total = int(r.headers.get("content-length", 0))
+        downloaded = offset
+        transfer_started = time.perf_counter()
+        disk_time = 0.0
+        with open(part_path, mode) as f:
+            for chunk in r.iter_content(CHUNK_SIZE):
+                write_started = time.perf_counter()
+                f.write(chunk)
+                disk_time += time.perf_counter() - write_started
+                downloaded += len(chunk)
+                if total and on_progress:
+                    on_progress(int(downloaded * 100 / total))
+        if metrics:
+            metrics.observe_transfer(urlparse(r.url).netloc, time.perf_counter() - transfer_started - disk_time, disk_time, downloaded - offset)
+    if total and downloaded != total:
+        raise IncompleteDownload(f"incomplete download ({downloaded} of {total} bytes)")
+    if not keep_part:
+        os.replace(part_path, path)
+
+def content_hash(file_name):
+    match = CONTENT_HASH_RE.match(file_name.lower())
+    return match.group(1) if match else None
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(VERIFY_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def verify_file(path, expected=None, archives="keep", part_path=None):
+    # Runs in the verification process pool. Returns (actual sha256 or None when there is
+    # nothing to check against, archive entry count or None). With `part_path` that file is
+    # hashed and only moved to `path` once it matches; archives are only touched once their
+    # content is known to be right.
+    actual = hash_file(part_path or path) if expected else None
+    if actual != expected:
+        return actual, None
+    if part_path:
+        os.replace(part_path, path)
+    if archives == "keep" or os.path.splitext(path)[1].lower() != ".zip":
+        return actual, None
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+            if archives == "extract":
+                # extractall() drops absolute paths and ".." components
+                archive.extractall(os.path.splitext(path)[0])
+            else:
+                with open(path + ".txt", "w", encoding="utf-8") as f:
+                    f.write("\n".join(names) + "\n")
+    except zipfile.BadZipFile:
+        return actual, None
+    return actual, len(names)
+
+def link_or_copy(src, dst):
+    # Hardlink when src and dst share a filesystem, otherwise fall back to a copy
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
     try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+class HashIndex:
+    # Persistent content hash -> local path index shared by every creator in an output folder.
+    # Paths are stored relative to the output folder so the tree can be moved.
+
+    def __init__(self, root):
+        self.root = root
+        state_dir = os.path.join(root, STATE_DIR_NAME)
+        os.makedirs(state_dir, exist_ok=True)
+        db_path = os.path.join(state_dir, HASH_INDEX_NAME)
+        is_new = not os.path.exists(db_path)
+        self._lock = threading.Lock()
+        # Hashes currently being fetched, so duplicates wait instead of writing the same file twice
+        self._pending = set()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files (hash TEXT PRIMARY KEY, path TEXT NOT NULL)")
+        self._db.commit()
+        if is_new:
+            self.rebuild()
+
+    def rebuild(self):
+        # Re-scans the output tree; returns the number of indexed files
+        rows = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d != STATE_DIR_NAME]
+            for name in filenames:
+                digest = content_hash(name)
+                if digest and not name.endswith((PART_SUFFIX, SEGMENTS_SUFFIX)):
+                    rows.append((digest, os.path.relpath(os.path.join(dirpath, name), self.root)))
+        with self._lock:
+            self._db.execute("DELETE FROM files")
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?)", rows)
+            self._db.commit()
+        return len(rows)
+
+    def lookup(self, digest):
+        with self._lock:
+            row = self._db.execute("SELECT path FROM files WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        path = os.path.join(self.root, row[0])
+        if os.path.exists(path):
+            return path
+        # Stale entry: the file was moved or deleted outside the app
+        with self._lock:
+            self._db.execute("DELETE FROM files WHERE hash = ?", (digest,))
+            self._db.commit()
+        return None
+
+    def add(self, digest, path):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?)", (digest, os.path.relpath(path, self.root)))
+            self._db.commit()
+
+    def claim(self, digest):
+        # True if the caller should fetch `digest`; False while another worker is already fetching it
+        with self._lock:
+            if digest in self._pending:
+                return False
+            self._pending.add(digest)
+            return True
+
+    def release(self, digest):
+        with self._lock:
+            self._pending.discard(digest)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class SyncManifest:
+    # Per-creator record of synced posts, completed files and the creator's name. It is
+    # written when the creator's run ends; posts are only committed if that run had no
+    # errors, so an interrupted or failed run lists everything again next time.
+
+    def __init__(self, root, service, creator_id):
+        manifest_dir = os.path.join(root, STATE_DIR_NAME, MANIFEST_DIR_NAME)
+        os.makedirs(manifest_dir, exist_ok=True)
+        self.path = os.path.join(manifest_dir, sanitize_filename(f"{service}_{creator_id}") + ".json")
+        self.posts = {}
+        self.files = set()
+        # Cached so a re-sync doesn't need the profile request
+        self.name = None
+        self._seen_posts = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+            self.posts = data.get("posts", {})
+            self.files = set(data.get("files", []))
+            self.name = data.get("name")
+
+    @staticmethod
+    def _post_stamp(post):
+        return post.get("edited") or post.get("published") or ""
+
+    def is_known_post(self, post):
+        return self.posts.get(str(post.get("id"))) == self._post_stamp(post)
+
+    def see_post(self, post):
+        self._seen_posts[str(post.get("id"))] = self._post_stamp(post)
+
+    def has_file(self, rel_path):
+        return rel_path in self.files
+
+    def add_file(self, rel_path):
+        with self._lock:
+            self.files.add(rel_path)
+
+    def save(self, commit_posts):
+        with self._lock:
+            if commit_posts:
+                self.posts.update(self._seen_posts)
+                self._seen_posts.clear()
+            data = {"name": self.name, "posts": self.posts, "files": sorted(self.files)}
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(self.path + ".tmp", self.path)
+
+class CreatorCatalogue:
+    # Column lists over creators.txt, ordered by favorites. Names are searched through a
+    # single lowercase newline-joined blob with str.find, and services through per-service row arrays.
+
+    def __init__(self, creators):
+        creators = sorted(creators, key=lambda a: a.get("favorited", 0), reverse=True)
+        self.ids = [str(a["id"]) for a in creators]
+        self.names = [a.get("name", "") for a in creators]
+        self.services = [sys.intern(a["service"]) for a in creators]
+        self.favorited = array("q", (a.get("favorited", 0) or 0 for a in creators))
+        # Offsets come from the lowered names, which can be longer than the originals ("İ" -> "i̇")
+        lowered = [name.lower().replace("\n", " ") for name in self.names]
+        self._starts = array("q")
+        offset = 0
+        for name in lowered:
+            self._starts.append(offset)
+            offset += len(name) + 1
+        self._blob = "".join(name + "\n" for name in lowered)
+        self._by_service = {}
+        for row, service in enumerate(self.services):
+            self._by_service.setdefault(service, array("q")).append(row)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row(self, index):
+        return {"id": self.ids[index], "name": self.names[index], "service": self.services[index], "favorited": self.favorited[index]}
+
+    def search(self, term, service=None):
+        # Returns matching row indices, most favorited first
+        term = term.strip().lower()
+        if not term:
+            if service:
+                return list(self._by_service.get(service, ()))
+            return list(range(len(self)))
+        if "\n" in term:
+            return []
+        if len(term) <= 2:
+            # Very short terms match most names; one C-level pass beats a find() per hit
+            candidates = self._by_service.get(service, ()) if service else range(len(self))
+            names = self._blob.split("\n")
+            return [row for row in candidates if term in names[row]]
+        rows = []
+        pos = self._blob.find(term)
+        while pos != -1:
+            row = bisect_right(self._starts, pos) - 1
+            if not service or self.services[row] == service:
+                rows.append(row)
+            # Continue from the next name so each row is reported once
+            pos = self._blob.find(term, self._starts[row + 1] if row + 1 < len(self) else len(self._blob))
+        return rows
+
+def load_creator_catalogue(mode):
+    # Served from memory within CATALOGUE_TTL; otherwise revalidated against the
+    # on-disk copy with ETag / If-Modified-Since so an unchanged list is not downloaded again.
+    with _catalogue_lock:
+        cached = _catalogues.get(mode)
+    if cached and time.time() - cached[1] < CATALOGUE_TTL:
+        return cached[0]
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    data_path = os.path.join(CACHE_DIR, f"creators_{mode}.json")
+    meta_path = data_path + ".meta"
+    meta = {}
+    if os.path.exists(data_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    catalogue = None
+    try:
+        r = get_session().get(f"https://{mode}.su/api/v1/creators.txt", headers=headers, timeout=REQUEST_TIMEOUT)
+        if r.status_code == 304:
+            catalogue = cached[0] if cached else None
+        else:
+            r.raise_for_status()
+            with open(data_path + ".tmp", "wb") as f:
+                f.write(r.content)
+            os.replace(data_path + ".tmp", data_path)
+            with open(meta_path, "w") as f:
+                json.dump({"etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified")}, f)
+            catalogue = CreatorCatalogue(r.json())
+    except requests.RequestException:
+        # Offline: fall back to whatever copy we have
+        if cached:
+            catalogue = cached[0]
+        elif not os.path.exists(data_path):
+            raise
+    if catalogue is None:
+        with open(data_path) as f:
+            catalogue = CreatorCatalogue(json.load(f))
+    with _catalogue_lock:
+        _catalogues[mode] = (catalogue, time.time())
+    return catalogue
+
+class PostCountFetcher:
+    # Bounded background lookups of a creator's post count, cached for POST_COUNT_TTL
+    # and keyed by (service, id). Failures are cached as "?" for POST_COUNT_FAILURE_TTL so a
+    # row that keeps failing isn't refetched on every redraw. cancel_all() drops queued
+    # lookups and the callbacks of those already running; their results still land in the cache.
+
+    def __init__(self, workers=POST_COUNT_WORKERS, ttl=POST_COUNT_TTL, failure_ttl=POST_COUNT_FAILURE_TTL):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._cache = {}
+        self._pending = set()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def cached(self, service, creator_id):
+        with self._lock:
+            entry = self._cache.get((service, creator_id))
+        if entry and time.time() < entry[1]:
+            return entry[0]
+        return None
+
+    def request(self, domain, service, creator_id, callback):
+        count = self.cached(service, creator_id)
+        if count is not None:
+            callback(count)
+            return
+        key = (service, creator_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            generation = self._generation
+        self._executor.submit(self._fetch, domain, key, generation, callback)
+
+    def cancel_all(self):
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+
+    def _fetch(self, domain, key, generation, callback):
+        with self._lock:
+            if generation != self._generation:
+                return
+        service, creator_id = key
+        try:
+            posts = get_creator_posts(domain, service, creator_id)
+            # Only the first page is fetched, so a full page means "at least"
+            count = f"{len(posts)}+" if len(posts) >= POSTS_PER_PAGE else str(len(posts))
+        except Exception:
+            count = None
+        with self._lock:
+            if count is None:
+                self._cache[key] = ("?", time.time() + self.failure_ttl)
+            else:
+                self._cache[key] = (count, time.time() + self.ttl)
+            self._pending.discard(key)
+            current = generation == self._generation
+        if current:
+            callback(count or "?")
+
+def make_thumbnail(path):
+    # Returns a THUMBNAIL_SIZE PIL image for `path`, or None when the type has no preview.
+    # Thumbnails are cached on disk under the file's content hash, so reposts reuse them.
+    digest = content_hash(os.path.basename(path))
+    cache_path = os.path.join(THUMBNAIL_DIR, digest + ".png") if digest else None
+    if cache_path and os.path.exists(cache_path):
+        with Image.open(cache_path) as cached:
+            return cached.copy()
+    lower = path.lower()
+    if lower.endswith(PREVIEW_IMAGE_EXTENSIONS):
+        with Image.open(path) as img:
+            # Lets the JPEG decoder scale down by 1/2..1/8 instead of decoding full size
+            img.draft("RGB", THUMBNAIL_SIZE)
+            img.thumbnail(THUMBNAIL_SIZE)
+            thumb = img.copy()
+    elif cv2 and lower.endswith(PREVIEW_VIDEO_EXTENSIONS):
+        cap = cv2.VideoCapture(path)
+        try:
+            success, frame = cap.read()
+        finally:
+            cap.release()
+        if not success:
+            return None
+        thumb = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        thumb.thumbnail(THUMBNAIL_SIZE)
+    else:
+        return None
+    if thumb.mode not in ("RGB", "RGBA", "L", "P"):
+        thumb = thumb.convert("RGB")
+    if cache_path:
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        thumb.save(cache_path + ".tmp", "PNG")
+        os.replace(cache_path + ".tmp", cache_path)
+    return thumb
+
+class ThumbnailWorker:
+    # Builds previews on a background thread. Only the newest request is kept, so a
+    # burst of finished files costs one decode; on_ready(path, image, error) is called
+    # from the worker thread with the small image (None when there is no preview).
+
+    def __init__(self, on_ready):
+        self.on_ready = on_ready
+        self._latest = None
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def request(self, path):
+        with self._cond:
+            self._latest = path
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._latest is None:
+                    self._cond.wait()
+                path, self._latest = self._latest, None
+            try:
+                self.on_ready(path, make_thumbnail(path), None)
+            except Exception as e:
+                self.on_ready(path, None, e)
+
+def _is_retryable(error):
+    # 429/5xx, transport failures and short responses are worth another try; 4xx and
+    # local disk errors are not
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else 0
+        return status == 429 or status >= 500
+    if isinstance(error, requests.RequestException):
+        return True
+    return isinstance(error, IncompleteDownload)
+
+def _retry_after(error):
+    # Seconds requested by a Retry-After header (delta or HTTP date), if any
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class ChecksumMismatch(Exception):
+    # A downloaded file whose SHA-256 differs from the one in its data path
+    def __init__(self, file_name, actual):
+        super().__init__(f"{file_name} hashed to {actual}")
+        self.actual = actual
+
+class Deferred(Exception):
+    # Raised by a scheduled job that can't make progress yet; it is queued again
+    # after `delay` seconds without counting as a failure
+    def __init__(self, delay):
+        super().__init__(f"deferred for {delay}s")
+        self.delay = delay
+
+class _HostState:
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.backoff_until = 0.0
+        self.failures = 0
+        self.window_start = time.monotonic()
+        # Set when a job had to wait for this host's limit during the current window
+        self.saturated = False
+
+class _Job:
+    def __init__(self, host, fn, args, on_done):
+        self.host = host
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.attempts = 0
+        self.not_before = 0.0
+
+class _HostSlots:
+    def __init__(self, scheduler, host):
+        self.scheduler = scheduler
+        self.host = host
+
+    def reserve(self, wanted):
+        return self.scheduler._reserve(self.host, wanted)
+
+    def release(self, count):
+        self.scheduler._release(self.host, count)
+
+class DownloadScheduler:
+    # One long-lived pool of `max_workers` threads shared by every creator, with a single
+    # FIFO queue. Each host has a limit on open connections: a running job holds one, and
+    # a segmented download borrows more through slots(). Limits start at `max_connections`
+    # and follow AIMD on server signals only: +1 per window in which the limit held jobs
+    # back, -1 on a 5xx, halved (and the whole host paused) on a 429 or Retry-After.
+    # Failed jobs are retried after jittered exponential backoff.
+
+    def __init__(self, max_workers, max_connections=None, on_event=None):
+        self.max_workers = max_workers
+        self.max_connections = max_connections or max_workers
+        self.on_event = on_event or (lambda event, **data: None)
+        self._queue = deque()
+        self._hosts = {}
+        self._closed = False
+        # Workers currently running a job, and seconds of finished job time, for utilization
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._cond = threading.Condition()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.max_connections)
+        return state
+
+    def submit(self, url, fn, *args, on_done=None):
+        # on_done(result, error) runs on a worker thread once the job succeeds or gives up
+        with self._cond:
+            self._queue.append(_Job(urlparse(url).netloc, fn, args, on_done))
+            self._cond.notify()
+
+    def slots(self, url):
+        # Extra connections a running job can borrow from its host's limit
+        return _HostSlots(self, urlparse(url).netloc)
+
+    def _reserve(self, host, wanted):
+        # Never blocks: a job that waited for slots while holding one could deadlock the host
+        with self._cond:
+            state = self._host(host)
+            granted = max(0, min(wanted, state.limit - state.active))
+            state.active += granted
+            if granted < wanted:
+                state.saturated = True
+            return granted
+
+    def _release(self, host, count):
+        if count:
+            with self._cond:
+                self._host(host).active -= count
+                self._cond.notify_all()
+
+    def stats(self):
+        # Returns (queued jobs, busy workers, busy worker-seconds so far)
+        with self._cond:
+            return len(self._queue), self._busy, self._busy_seconds
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _adapt(self, host, state):
+        now = time.monotonic()
+        elapsed = now - state.window_start
+        if elapsed < ADAPT_WINDOW:
+            return
+        # Only a host that was actually held back by its limit needs a higher one
+        if state.saturated and state.limit < self.max_connections:
+            state.limit += 1
+            self.on_event("host_limit", host=host, limit=state.limit)
+        state.window_start = now
+        state.saturated = False
+
+    def _next_job(self):
+        # Returns (job, None) or (None, seconds to wait before something may become runnable)
+        now = time.monotonic()
+        wait = None
+        for index, job in enumerate(self._queue):
+            state = self._host(job.host)
+            ready_at = max(job.not_before, state.backoff_until)
+            if ready_at > now:
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            if state.active >= state.limit:
+                state.saturated = True
+                continue
+            del self._queue[index]
+            return job, None
+        return None, wait
+
+    def _backoff(self, job, state, error):
+        delay = _retry_after(error)
+        response = getattr(error, "response", None)
+        status = response.status_code if response is not None else 0
+        throttled = delay is not None or status == 429
+        job.attempts += 1
+        if not throttled:
+            if status >= 500:
+                # The server is struggling: one connection fewer, but no host-wide pause
+                state.limit = max(1, state.limit - 1)
+                self.on_event("host_limit", host=job.host, limit=state.limit)
+            # A dropped connection says nothing about the rest of the host's jobs
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (job.attempts - 1)) * random.uniform(0.5, 1.5)
+            job.not_before = time.monotonic() + delay
+            return delay
+        if delay is None:
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** state.failures) * random.uniform(0.5, 1.5)
+        state.failures += 1
+        state.limit = max(1, state.limit // 2)
+        state.backoff_until = max(state.backoff_until, time.monotonic() + delay)
+        job.not_before = state.backoff_until
+        return delay
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job, wait = self._next_job()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._cond.wait(wait)
+                    job, wait = self._next_job()
+                state = self._host(job.host)
+                state.active += 1
+                self._busy += 1
+            started = time.perf_counter()
+            result = error = None
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                error = e
+            with self._cond:
+                state.active -= 1
+                self._busy -= 1
+                self._busy_seconds += time.perf_counter() - started
+                if isinstance(error, Deferred):
+                    job.not_before = time.monotonic() + error.delay
+                    self._queue.append(job)
+                    self._cond.notify_all()
+                    continue
+                if error is not None and _is_retryable(error) and job.attempts < MAX_RETRIES:
+                    delay = self._backoff(job, state, error)
+                    self._queue.append(job)
+                    self._cond.notify_all()
+                    retry = True
+                else:
+                    if error is None:
+                        state.failures = 0
+                    self._adapt(job.host, state)
+                    retry = False
+                    # A slot on this host just opened up
+                    self._cond.notify_all()
+            if retry:
+                self.on_event("retry", host=job.host, attempt=job.attempts, delay=round(delay, 1), error=str(error))
+                continue
+            try:
+                if job.on_done:
+                    job.on_done(result, error)
+            except Exception:
+                # A failing consumer (e.g. a closed stdout) must not take the worker down with it
+                pass
+
+class _NodeStats:
+    def __init__(self, front):
+        self.front = front
+        # Averages are None until the node has served something
+        self.latency = None
+        self.throughput = None
+        self.failures = 0
+        self.down_until = 0.0
+
+    def expected_time(self):
+        if self.latency is None or not self.throughput:
+            return 0.0
+        return self.latency + MIRROR_REFERENCE_SIZE / self.throughput
+
+class MirrorManager:
+    # Data nodes (n1.kemono.su, ...) serving each front domain's /data paths, learned from
+    # the front's redirects. New downloads go straight to the healthy node with the lowest
+    # expected fetch time, skipping the redirect; a node that fails is benched for a cooldown
+    # that doubles with each consecutive failure. Untried nodes rank first so each is measured.
+
+    def __init__(self):
+        self._nodes = {}
+        self._resolves = {}
+        self._lock = threading.Lock()
+
+    def is_node(self, host):
+        with self._lock:
+            return host in self._nodes
+
+    def resolve(self, url, exclude=()):
+        # Returns `url` pointed at the best healthy node of its front domain, or unchanged
+        # while no node is known (or every node is excluded or cooling down)
+        parsed = urlparse(url)
+        now = time.monotonic()
+        with self._lock:
+            count = self._resolves.get(parsed.netloc, 0)
+            self._resolves[parsed.netloc] = count + 1
+            candidates = [
+                (stats.expected_time(), host) for host, stats in self._nodes.items()
+                if stats.front == parsed.netloc and host not in exclude and stats.down_until <= now
+            ]
+        if not candidates or (not exclude and count % MIRROR_PROBE_EVERY == 0):
+            return url
+        return parsed._replace(netloc=min(candidates)[1]).geturl()
+
+    def observe_response(self, url, response):
+        # Learns the node the front redirected `url` to and records its time to first byte
+        front = urlparse(url).netloc
+        host = urlparse(response.url).netloc
+        if host == front:
+            return
+        with self._lock:
+            stats = self._nodes.get(host)
+            if stats is None:
+                stats = self._nodes[host] = _NodeStats(front)
+            latency = response.elapsed.total_seconds()
+            stats.latency = latency if stats.latency is None else stats.latency + MIRROR_EWMA * (latency - stats.latency)
+
+    def record_transfer(self, host, seconds, nbytes):
+        with self._lock:
+            stats = self._nodes.get(host)
+            if stats is None:
+                return
+            stats.failures = 0
+            if seconds > 0 and nbytes > 0:
+                rate = nbytes / seconds
+                stats.throughput = rate if stats.throughput is None else stats.throughput + MIRROR_EWMA * (rate - stats.throughput)
+
+    def record_failure(self, host):
+        with self._lock:
+            stats = self._nodes.get(host)
+            if stats is None:
+                return
+            stats.failures += 1
+            cooldown = min(MIRROR_MAX_COOLDOWN, MIRROR_COOLDOWN * 2 ** (stats.failures - 1))
+            stats.down_until = time.monotonic() + cooldown
+
+    def snapshot(self):
+        # {node: {"front", "latency_ms", "mb_per_s", "healthy"}} for reports
+        now = time.monotonic()
+        with self._lock:
+            return {
+                host: {
+                    "front": stats.front,
+                    "latency_ms": round(stats.latency * 1000, 1) if stats.latency is not None else None,
+                    "mb_per_s": round(stats.throughput / 1e6, 3) if stats.throughput else None,
+                    "healthy": stats.down_until <= now,
+                }
+                for host, stats in self._nodes.items()
+            }
+
+class _Histogram:
+    def __init__(self):
+        # One count per METRICS_BUCKETS bound plus the +Inf bucket
+        self.buckets = [0] * (len(METRICS_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation, so an estimate from above
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets[:-1]):
+            seen += n
+            if seen >= rank:
+                return METRICS_BUCKETS[index]
+        return METRICS_BUCKETS[-1]
+
+class RunMetrics:
+    # Timings and counters for one engine run. Stage times are bucketed like Prometheus
+    # histograms so a long batch sync keeps constant memory; queue depth and worker
+    # utilization are read from the scheduler whenever a report is taken.
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages = {stage: _Histogram() for stage in METRICS_STAGES}
+        self.host_bytes = {}
+        self.host_retries = {}
+        self.files = {"ok": 0, "skip": 0, "dedup": 0, "error": 0}
+        self.scheduler = None
+        self.workers = 0
+        self.lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        index = bisect_left(METRICS_BUCKETS, seconds)
+        with self.lock:
+            histogram = self.stages[stage]
+            histogram.buckets[index] += 1
+            histogram.count += 1
+            histogram.sum += seconds
+
+    def observe_connect(self, host, seconds):
+        self.observe("connect", seconds)
+
+    def observe_transfer(self, host, transfer_seconds, disk_seconds, nbytes):
+        self.observe("transfer", transfer_seconds)
+        self.observe("disk_write", disk_seconds)
+        with self.lock:
+            self.host_bytes[host] = self.host_bytes.get(host, 0) + nbytes
+
+    def count_retry(self, host):
+        with self.lock:
+            self.host_retries[host] = self.host_retries.get(host, 0) + 1
+
+    def count_file(self, status):
+        with self.lock:
+            self.files[status] += 1
+
+    def _scheduler_stats(self):
+        if self.scheduler is None:
+            return 0, 0, 0.0
+        return self.scheduler.stats()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        queued, busy, busy_seconds = self._scheduler_stats()
+        hits, misses = session_pool_stats()
+        with self.lock:
+            stages = {
+                stage: {
+                    "count": h.count,
+                    "total_s": round(h.sum, 3),
+                    "mean_ms": round(h.sum / h.count * 1000, 1) if h.count else 0.0,
+                    "p50_ms": h.quantile(0.5) * 1000,
+                    "p99_ms": h.quantile(0.99) * 1000,
+                }
+                for stage, h in self.stages.items()
+            }
+            hosts = {
+                host: {"bytes": self.host_bytes.get(host, 0), "retries": self.host_retries.get(host, 0)}
+                for host in sorted(set(self.host_bytes) | set(self.host_retries))
+            }
+            files = dict(self.files)
+        total_bytes = sum(h["bytes"] for h in hosts.values())
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "files": files,
+            "bytes": total_bytes,
+            "mb_per_s": round(total_bytes / elapsed / 1e6, 3) if elapsed else 0.0,
+            "stages": stages,
+            "hosts": hosts,
+            "queue_depth": queued,
+            "workers": self.workers,
+            "busy_workers": busy,
+            "worker_utilization": round(busy_seconds / (self.workers * elapsed), 3) if self.workers and elapsed else 0.0,
+            "pool_hits": hits,
+            "pool_misses": misses,
+        }
+
+    def prometheus_text(self):
+        queued, busy, busy_seconds = self._scheduler_stats()
+        hits, misses = session_pool_stats()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP kemonodrive_{name} {help_text}")
+            lines.append(f"# TYPE kemonodrive_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"kemonodrive_{name}{suffix}{{{label_text}}} {value}" if label_text else f"kemonodrive_{name}{suffix} {value}")
+
+        with self.lock:
+            samples = []
+            for stage, h in self.stages.items():
+                cumulative = 0
+                for bound, n in zip(METRICS_BUCKETS + ("+Inf",), h.buckets):
+                    cumulative += n
+                    samples.append(("_bucket", {"stage": stage, "le": bound}, cumulative))
+                samples.append(("_sum", {"stage": stage}, round(h.sum, 6)))
+                samples.append(("_count", {"stage": stage}, h.count))
+            metric("stage_seconds", "histogram", "Time spent per download stage.", samples)
+            metric("host_bytes_total", "counter", "Bytes received per host.",
+                   [("", {"host": host}, n) for host, n in sorted(self.host_bytes.items())])
+            metric("host_retries_total", "counter", "Retried requests per host.",
+                   [("", {"host": host}, n) for host, n in sorted(self.host_retries.items())])
+            metric("files_total", "counter", "Files finished, by outcome.",
+                   [("", {"status": status}, n) for status, n in self.files.items()])
+        metric("queue_depth", "gauge", "Files waiting in the scheduler.", [("", {}, queued)])
+        metric("workers", "gauge", "Download worker threads.", [("", {}, self.workers)])
+        metric("workers_busy", "gauge", "Workers currently running a job.", [("", {}, busy)])
+        metric("worker_busy_seconds_total", "counter", "Worker time spent in finished jobs.", [("", {}, round(busy_seconds, 3))])
+        metric("pool_reused_total", "counter", "Requests served on a reused connection.", [("", {}, hits)])
+        metric("pool_connections_total", "counter", "Connections opened.", [("", {}, misses)])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Atomic so a node_exporter textfile collector never reads half a file
+        with open(path + ".tmp", "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(path + ".tmp", path)
+
+def serve_metrics(metrics, port, bind="127.0.0.1"):
+    # Serves metrics.prometheus_text() on http://<bind>:<port>/metrics from a daemon thread
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((bind, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StackSampler:
+    # Opt-in sampling profiler: every PROFILE_INTERVAL seconds it records the stack of each
+    # thread that isn't idle, and save() writes them in the collapsed "a;b;c count" format
+    # read by flamegraph.pl and speedscope. Unlike cProfile it sees every worker and segment
+    # thread at once and costs the workers nothing between samples.
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                # Threads parked on a condition, an empty executor queue or a server socket are idle, not slow
+                if (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in PROFILE_IDLE_FRAMES:
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                key = ";".join(reversed(names))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def save(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+class _CreatorRun:
+    def __init__(self, creator, save_dir, manifest):
+        self.creator = creator
+        self.save_dir = save_dir
+        self.manifest = manifest
+        self.listed = 0
+        self.completed = 0
+        self.errors = 0
+        self.listing_done = False
+        self.listing_ok = False
+        self.finished = False
+        self.lock = threading.Lock()
+
+class DownloadEngine:
+    # Headless download pipeline: enumerate -> plan -> download -> post-process.
+    # Progress is reported as on_event(event, data) calls from worker threads;
+    # nothing in here touches Tk, so the GUI and the CLI are both just consumers.
+
+    def __init__(self, out, workers=DEFAULT_WORKERS, segments=DEFAULT_SEGMENTS,
+                 segment_threshold=DEFAULT_SEGMENT_THRESHOLD_MB * 1024 * 1024, sync=True, archives="keep", on_event=None):
+        self.out = out
+        self.workers = workers
+        self.segments = segments
+        self.segment_threshold = segment_threshold
+        self.sync = sync
+        self.archives = archives
+        self.on_event = on_event or (lambda event, data: None)
+        # Created up front so an exporter can be attached before run() starts
+        self.metrics = RunMetrics()
+        self.mirrors = MirrorManager()
+        self.hash_index = None
+        self.scheduler = None
+        self.verifier = None
+        self._in_flight = None
+        # Files queued and not yet through verification, which may outlast their download job
+        self._unfinished_files = 0
+        self._files_cond = threading.Condition()
+        self._made_dirs = set()
+
+    def emit(self, event, **data):
+        if event == "file_done":
+            self.metrics.count_file(data["status"])
+        elif event == "file_error":
+            self.metrics.count_file("error")
+        elif event == "retry":
+            self.metrics.count_retry(data["host"])
+        self.on_event(event, data)
+
+    def run(self, urls):
+        global _connect_observer
+        os.makedirs(self.out, exist_ok=True)
+        # Size the shared pools for the download workers and their segments plus the page prefetchers
+        get_session(self.workers * self.segments + PAGE_PREFETCH * CREATOR_LISTERS)
+        self.hash_index = HashIndex(self.out)
+        # Files from every creator share one scheduler, so the pool never drains between creators
+        # Host limits count connections, so segments of a large file share them with other jobs
+        self.scheduler = DownloadScheduler(self.workers, min(self.workers * self.segments, HOST_MAX_CONNECTIONS), on_event=self.emit)
+        self.metrics.started = time.monotonic()
+        self.metrics.scheduler = self.scheduler
+        self.metrics.workers = self.workers
+        _connect_observer = self.metrics.observe_connect
+        # Bounds the files waiting in the scheduler so memory stays flat for huge creators
+        self._in_flight = threading.Semaphore(self.workers * QUEUE_PER_WORKER)
+        # Spawned rather than forked: forking a process full of threads can copy held locks
+        self.verifier = ProcessPoolExecutor(VERIFY_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            # Several creators are listed at once so a re-sync of hundreds takes seconds
+            with ThreadPoolExecutor(max_workers=CREATOR_LISTERS) as listers:
+                for url in urls:
+                    listers.submit(self._enumerate_safely, url)
+            with self._files_cond:
+                while self._unfinished_files:
+                    self._files_cond.wait()
+        finally:
+            _connect_observer = None
+            self.scheduler.shutdown()
+            self.verifier.shutdown()
+            self.hash_index.close()
+        hits, misses = session_pool_stats()
+        self.emit("run_done", pool_hits=hits, pool_misses=misses, metrics=self.metrics.report(), mirrors=self.mirrors.snapshot())
+
+    def _enumerate_safely(self, url):
+        try:
+            self.enumerate_creator(url)
+        except Exception as e:
+            self.emit("creator_error", url=url, error=str(e))
+
+    def enumerate_creator(self, url):
+        # Queues the creator's files and returns once listing is done; runs on one of the
+        # lister threads, and downloads carry on in the scheduler meanwhile
+        domain, service, cid = extract_domain_service_id(url)
+        manifest = SyncManifest(self.out, service, cid)
+        creator = manifest.name if self.sync and manifest.name else get_creator_name(domain, service, cid)
+        # get_creator_name() falls back to the id when the profile can't be fetched; don't pin that
+        if creator != cid:
+            manifest.name = creator
+        save_dir = os.path.join(self.out, creator)
+        os.makedirs(save_dir, exist_ok=True)
+        self.emit("creator_start", creator=creator, url=url)
+        run = _CreatorRun(creator, save_dir, manifest)
+        try:
+            # Downloads start on the first page while later pages are still being listed
+            for file_url in iter_creator_files(domain, service, cid, run.manifest if self.sync else None):
+                self._in_flight.acquire()
+                with run.lock:
+                    run.listed += 1
+                    listed = run.listed
+                self.emit("file_queued", creator=creator, listed=listed)
+                with self._files_cond:
+                    self._unfinished_files += 1
+                self._submit(run, file_url)
+            run.listing_ok = True
+        finally:
+            with run.lock:
+                run.listing_done = True
+            self._finish_creator(run)
+
+    def _submit(self, run, file_url, attempt=0):
+        self.scheduler.submit(file_url, self.download, file_url, run.save_dir, run.manifest,
+                              on_done=lambda result, error: self._downloaded(run, file_url, attempt, result, error))
+
+    def _downloaded(self, run, file_url, attempt, result, error):
+        # A fresh download comes back as a Future that settles once the file is verified
+        if error is None and isinstance(result, Future):
+            result.add_done_callback(lambda future: self._verified(run, file_url, attempt, future))
+            return
+        self._file_done(run, file_url, error)
+
+    def _verified(self, run, file_url, attempt, future):
+        error = future.exception()
+        if isinstance(error, ChecksumMismatch) and attempt < VERIFY_RETRIES:
+            self.emit("verify_failed", creator=run.creator, file=os.path.basename(urlparse(file_url).path), attempt=attempt + 1, error=str(error))
+            self._submit(run, file_url, attempt + 1)
+            return
+        self._file_done(run, file_url, error)
+
+    def _file_done(self, run, file_url, error):
+        # Often called from a Future callback, where exceptions vanish; the bookkeeping
+        # run() waits on has to happen whatever emit() or the manifest do
+        try:
+            with run.lock:
+                run.completed += 1
+                if error:
+                    run.errors += 1
+                completed, listed = run.completed, run.listed
+            if error:
+                self.emit("file_error", creator=run.creator, file=os.path.basename(urlparse(file_url).path), url=file_url, error=str(error))
+            self.emit("creator_progress", creator=run.creator, completed=completed, listed=listed)
+            self._finish_creator(run)
+        finally:
+            self._in_flight.release()
+            with self._files_cond:
+                self._unfinished_files -= 1
+                self._files_cond.notify_all()
+
+    def _finish_creator(self, run):
+        with run.lock:
+            if run.finished or not run.listing_done or run.completed < run.listed:
+                return
+            run.finished = True
+        run.manifest.save(commit_posts=run.listing_ok and not run.errors)
+        self.emit("creator_done", creator=run.creator, files=run.listed, errors=run.errors)
+
+    def plan(self, url, save_dir):
+        # Returns (path, path relative to the creator folder), or None for unsupported types
         file_name = os.path.basename(urlparse(url).path)
-        file_label.set(f"Downloading: {file_name}")
         subfolder = get_file_type_folder(file_name)
         if subfolder is None:
-            log_box.insert(tk.END, f"[SKIP] {file_name} (unsupported type)\n")
-            return
-        target_folder = os.path.join(save_dir, subfolder)
-        os.makedirs(target_folder, exist_ok=True)
-        path = os.path.join(target_folder, file_name)
+            return None
+        rel_path = os.path.join(subfolder, file_name)
+        return os.path.join(save_dir, rel_path), rel_path
 
-        if os.path.exists(path):
-            log_box.insert(tk.END, f"[SKIP] {file_name}\n")
-            return
+    def download(self, url, save_dir, manifest):
+        file_name = os.path.basename(urlparse(url).path)
+        planned = self.plan(url, save_dir)
+        if planned is None:
+            self.emit("file_skipped", file=file_name, reason="unsupported type")
+            return None
+        path, rel_path = planned
+        # Completed files are answered from the manifest without touching the disk
+        if self.sync and manifest.has_file(rel_path):
+            self.emit("file_done", file=file_name, path=path, status="skip")
+            return path
+        target_folder = os.path.dirname(path)
+        if target_folder not in self._made_dirs:
+            os.makedirs(target_folder, exist_ok=True)
+            self._made_dirs.add(target_folder)
+        digest = content_hash(file_name)
+        if digest and not self.hash_index.claim(digest):
+            # Another worker is fetching or linking the same content; check back once it is
+            # done rather than holding a slot of the host it is waiting on
+            raise Deferred(DEDUP_RECHECK_DELAY)
 
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(url, stream=True, headers=headers)
-        total = int(r.headers.get("content-length", 0))
-        downloaded = 0
+        last_percent = [-1]
 
-        def update_progress(value):
-            file_bar["value"] = value
+        def on_progress(percent):
+            # Only whole-percent changes are worth an event
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                self.emit("file_progress", file=file_name, percent=percent)
 
-        with open(path, 'wb') as f:
-            for chunk in r.iter_content(8192):
-                f.write(chunk)
-                downloaded += len(chunk)
-                if total:
-                    percent = int(downloaded * 100 / total)
-                    file_bar.after_idle(update_progress, percent)
+        handed_off = False
+        try:
+            # Checked under the claim: a post often lists its file a second time as an
+            # attachment, and the other job's copy only counts once it has been verified
+            if os.path.exists(path):
+                if manifest.has_file(rel_path) or not digest:
+                    self.emit("file_done", file=file_name, path=path, status="skip")
+                    return path
+                # Left by an older version or another tool; hashed before it is trusted
+                verified = self.verify(path, path, rel_path, digest, manifest, status="skip")
+                handed_off = True
+                return verified
+            if digest:
+                # Satisfy reposts and cross-posts from a copy we already have
+                existing = self.hash_index.lookup(digest)
+                if existing:
+                    link_or_copy(existing, path)
+                    self.post_process(path, rel_path, digest, manifest)
+                    self.emit("file_done", file=file_name, path=path, status="dedup")
+                    return path
+            # Written to a .part file first, so an interrupted run resumes instead of keeping a
+            # truncated file, and only renamed into place once its hash matches
+            self.fetch(url, path, on_progress)
+            verified = self.verify(path + PART_SUFFIX, path, rel_path, digest, manifest)
+            handed_off = True
+        finally:
+            if digest and not handed_off:
+                self.hash_index.release(digest)
+        return verified
+
+    def verify(self, source, path, rel_path, digest, manifest, status="ok"):
+        # Hands `source` (a finished .part file, or `path` itself) to the process pool and
+        # returns a Future for `path`. The file is only moved into place, indexed and recorded
+        # in the manifest once its hash matches; a mismatch deletes it and fails the Future
+        # with ChecksumMismatch so the file can be fetched again.
+        file_name = os.path.basename(path)
+        size = os.path.getsize(source)
+        result = Future()
+        started = time.perf_counter()
+
+        def on_checked(future):
+            self.metrics.observe("verify", time.perf_counter() - started)
+            try:
+                actual, entries = future.result()
+                if actual != digest:
+                    os.remove(source)
+                    raise ChecksumMismatch(file_name, actual)
+                self.post_process(path, rel_path, digest, manifest)
+                if entries is not None:
+                    self.emit("archive", file=file_name, path=path, entries=entries, mode=self.archives)
+                self.emit("file_done", file=file_name, path=path, status=status, size=size)
+                result.set_result(path)
+            except Exception as e:
+                result.set_exception(e)
+            finally:
+                if digest:
+                    self.hash_index.release(digest)
+
+        self.verifier.submit(verify_file, path, digest, self.archives, source if source != path else None).add_done_callback(on_checked)
+        return result
+
+    def fetch(self, url, path, on_progress):
+        # Downloads `path + .part` from the best known data node, moving to another node when
+        # one fails or stalls; the .part file left behind is resumed from there with a Range
+        # request. The finished .part is left for verify() to rename.
+        part_path = path + PART_SUFFIX
+        front = urlparse(url).netloc
+        tried = set()
+        source = self.mirrors.resolve(url)
+        for attempt in range(MIRROR_FAILOVERS + 1):
+            served = [urlparse(source).netloc]
+
+            def on_response(r):
+                served[0] = urlparse(r.url).netloc
+                self.mirrors.observe_response(url, r)
+
+            before = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            started = time.perf_counter()
+            try:
+                fetch_to_file(source, path, on_progress, self.segments, self.segment_threshold, self.metrics, on_response,
+                              self.scheduler.slots(url), keep_part=True)
+            except Exception as e:
+                node = served[0]
+                if node == front or attempt == MIRROR_FAILOVERS or not self.mirrors.is_node(node):
+                    raise
+                missing = isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 404
+                if not missing and not _is_retryable(e):
+                    raise
+                tried.add(node)
+                if missing:
+                    # The node lacks this file; let the front redirect to one that has it
+                    source = url
+                else:
+                    self.mirrors.record_failure(node)
+                    source = self.mirrors.resolve(url, exclude=tried)
+                self.emit("failover", file=os.path.basename(path), host=node, to=urlparse(source).netloc, error=str(e))
+                continue
+            after = os.path.getsize(part_path)
+            self.mirrors.record_transfer(served[0], time.perf_counter() - started, after - before)
+            return
 
-        log_box.insert(tk.END, f"[OK] {file_name}\n")
-        file_bar["value"] = 0
-    except Exception as e:
-        log_box.insert(tk.END, f"[ERROR] {file_name} — {e}\n")
+    def post_process(self, path, rel_path, digest, manifest):
+        started = time.perf_counter()
+        if digest:
+            self.hash_index.add(digest, path)
+        manifest.add_file(rel_path)
+        self.metrics.observe("post_process", time.perf_counter() - started)
 
 def start_gui():
     root = tk.Tk()
@@ -133,6 +1730,24 @@ def start_gui():
     ttk.Label(settings_tab, text="Number of Workers:").pack(anchor="w", padx=10, pady=(10, 0))
     ttk.Spinbox(settings_tab, from_=MIN_WORKERS, to=MAX_WORKERS, textvariable=worker_count, width=5).pack(anchor="w", padx=10)
 
+    # Large files are split into this many concurrent ranges
+    segment_count = tk.IntVar(value=DEFAULT_SEGMENTS)
+    segment_threshold_mb = tk.IntVar(value=DEFAULT_SEGMENT_THRESHOLD_MB)
+
+    ttk.Label(settings_tab, text="Segments per File:").pack(anchor="w", padx=10, pady=(10, 0))
+    ttk.Spinbox(settings_tab, from_=MIN_SEGMENTS, to=MAX_SEGMENTS, textvariable=segment_count, width=5).pack(anchor="w", padx=10)
+    ttk.Label(settings_tab, text="Segment Files Larger Than (MB):").pack(anchor="w", padx=10, pady=(10, 0))
+    ttk.Spinbox(settings_tab, from_=1, to=100000, textvariable=segment_threshold_mb, width=7).pack(anchor="w", padx=10)
+
+    # Incremental sync: stop listing at posts already synced on a previous run
+    sync_only_new = tk.BooleanVar(value=True)
+    ttk.Checkbutton(settings_tab, text="Only fetch new posts (sync)", variable=sync_only_new).pack(anchor="w", padx=10, pady=(10, 0))
+
+    # Follow-up work for verified .zip files, done in the verification processes
+    archive_mode = tk.StringVar(value=ARCHIVE_MODES[0])
+    ttk.Label(settings_tab, text="Zip Archives:").pack(anchor="w", padx=10, pady=(10, 0))
+    ttk.Combobox(settings_tab, values=ARCHIVE_MODES, textvariable=archive_mode, state="readonly", width=8).pack(anchor="w", padx=10)
+
     dl_tab = ttk.Frame(notebook)
     notebook.add(dl_tab, text="Download")
 
@@ -153,6 +1768,8 @@ def start_gui():
     artist_bar.pack(fill="x", padx=10, pady=(2, 2))
     file_bar = ttk.Progressbar(dl_tab, mode="determinate")
     file_bar.pack(fill="x", padx=10)
+    stats_text = tk.StringVar()
+    ttk.Label(dl_tab, textvariable=stats_text).pack(anchor="w", padx=10, pady=(2, 0))
 
     # Preview label for image/video preview
     preview_label = ttk.Label(dl_tab)
@@ -162,6 +1779,131 @@ def start_gui():
     log_box = tk.Text(dl_tab, height=10, bg="#2e2e2e", fg="lightgray", insertbackground="white")
     log_box.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
+    # UI event bus: worker threads only put (event, data) on this queue; the main thread
+    # drains it UI_FPS times a second, so the Tk cost per frame doesn't grow with the worker count
+    ui_events = queue.Queue()
+    # Creators overlap in the scheduler; artist_bar follows the one being listed
+    run_state = {"creator": None, "listed": 0, "completed": 0, "bytes": 0, "samples": deque()}
+
+    # Previews are decoded off the main thread; only the finished small image comes back on the bus
+    thumbnails = ThumbnailWorker(lambda path, image, error: ui_events.put(("preview", {"image": image, "error": error})))
+
+    def show_preview(image, error):
+        if error is not None:
+            preview_label.config(image='', text='[Preview Error]')
+        elif image is None:
+            preview_label.config(image='', text='[No Preview]')
+        else:
+            preview_img = ImageTk.PhotoImage(image)
+            preview_label.config(image=preview_img, text="")
+            preview_label.image = preview_img
+
+    def reset_run_state():
+        run_state.update(creator=None, listed=0, completed=0, bytes=0)
+        run_state["samples"].clear()
+        stats_text.set("")
+
+    def apply_event(event, data, frame):
+        # Folds one event into this frame's batched widget updates
+        lines = frame["lines"]
+        if event == "log":
+            lines.append(data["text"])
+        elif event == "creator_start":
+            run_state["creator"] = data["creator"]
+            frame["artist_max"] = 1
+            frame["artist_value"] = 0
+            lines.append(f"== {data['creator']} ==\n")
+        elif event == "file_queued":
+            run_state["listed"] += 1
+            if data["creator"] == run_state["creator"]:
+                frame["artist_max"] = data["listed"]
+        elif event == "creator_progress":
+            run_state["completed"] += 1
+            if data["creator"] == run_state["creator"]:
+                frame["artist_value"] = data["completed"]
+        elif event == "file_progress":
+            # Only the newest percentage per frame reaches the bar
+            frame["file_percent"] = data["percent"]
+        elif event == "file_done":
+            lines.append(f"[{data['status'].upper()}] {data['file']}\n")
+            if data["status"] == "ok":
+                run_state["bytes"] += data.get("size", 0)
+                frame["file_percent"] = 0
+            frame["preview"] = data["path"]
+        elif event == "file_skipped":
+            lines.append(f"[SKIP] {data['file']} ({data['reason']})\n")
+        elif event == "file_error":
+            lines.append(f"[ERROR] {data['file']} — {data['error']}\n")
+        elif event == "creator_done":
+            lines.append(f"== {data['creator']} done ({data['files']} files) ==\n")
+        elif event == "creator_error":
+            lines.append(f"[ERROR] {data['url']} — {data['error']}\n")
+        elif event == "retry":
+            lines.append(f"[RETRY] {data['host']} in {data['delay']}s — {data['error']}\n")
+        elif event == "verify_failed":
+            lines.append(f"[CORRUPT] {data['file']} — downloading again ({data['error']})\n")
+        elif event == "archive":
+            lines.append(f"[ZIP] {data['file']} — {data['entries']} entries ({data['mode']})\n")
+        elif event == "failover":
+            lines.append(f"[FAILOVER] {data['file']} {data['host']} -> {data['to']} — {data['error']}\n")
+        elif event == "preview":
+            frame["preview_image"] = data
+        elif event == "run_done":
+            lines.append(f"Connection pool: {data['pool_hits']} reused, {data['pool_misses']} opened\n")
+            stages = data["metrics"]["stages"]
+            lines.append("Time per stage: " + ", ".join(f"{stage} {info['total_s']}s" for stage, info in stages.items() if info["count"]) + "\n")
+            lines.append(f"Worker utilization: {data['metrics']['worker_utilization']:.0%}\n")
+            frame["status"] = "Done."
+
+    def update_stats():
+        now = time.monotonic()
+        samples = run_state["samples"]
+        samples.append((now, run_state["completed"], run_state["bytes"]))
+        while now - samples[0][0] > STATS_WINDOW:
+            samples.popleft()
+        elapsed = now - samples[0][0]
+        if elapsed <= 0 or not run_state["listed"]:
+            return
+        files_rate = (run_state["completed"] - samples[0][1]) / elapsed
+        bytes_rate = (run_state["bytes"] - samples[0][2]) / elapsed
+        remaining = run_state["listed"] - run_state["completed"]
+        eta = time.strftime("%H:%M:%S", time.gmtime(remaining / files_rate)) if files_rate and remaining else "--:--:--"
+        stats_text.set(f"{run_state['completed']}/{run_state['listed']} files · {files_rate:.1f} files/s · {bytes_rate / 1e6:.2f} MB/s · ETA {eta}")
+
+    def drain_ui_events():
+        frame = {"lines": []}
+        try:
+            # Cap the work per frame so a burst can't stall the event loop
+            for _ in range(UI_MAX_EVENTS_PER_FRAME):
+                event, data = ui_events.get_nowait()
+                apply_event(event, data, frame)
+        except queue.Empty:
+            pass
+        if frame["lines"]:
+            log_box.insert(tk.END, "".join(frame["lines"]))
+            # The log keeps only the newest LOG_MAX_LINES lines
+            excess = int(log_box.index("end-1c").split(".")[0]) - LOG_MAX_LINES
+            if excess > 0:
+                log_box.delete("1.0", f"{excess + 1}.0")
+            log_box.see(tk.END)
+        if "artist_max" in frame:
+            artist_bar.config(maximum=frame["artist_max"])
+        if "artist_value" in frame:
+            artist_bar.config(value=frame["artist_value"])
+        if "file_percent" in frame:
+            file_bar.config(value=frame["file_percent"])
+        # Only the newest finished file per frame gets previewed
+        if frame.get("preview"):
+            thumbnails.request(frame["preview"])
+        if "preview_image" in frame:
+            show_preview(frame["preview_image"]["image"], frame["preview_image"]["error"])
+        if "status" in frame:
+            file_status.set(frame["status"])
+        update_stats()
+        root.after(1000 // UI_FPS, drain_ui_events)
+
+    root.after(1000 // UI_FPS, drain_ui_events)
+
     def start_download():
         urls = url_box.get("1.0", "end").strip().splitlines()
         out = output_dir.get()
@@ -170,110 +1912,20 @@ def start_gui():
             return
         os.makedirs(out, exist_ok=True)
         log_box.delete("1.0", tk.END)
+        reset_run_state()
+        file_status.set("")
 
-        def update_preview(path):
-            try:
-                # Clear text if previously set
-                preview_label.config(text="")
-                if path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                    img = Image.open(path)
-                    img.thumbnail((200, 200))
-                    preview_img = ImageTk.PhotoImage(img)
-                    preview_label.config(image=preview_img)
-                    preview_label.image = preview_img
-                elif cv2 and path.lower().endswith(('.mp4', '.webm', '.mov', '.avi', '.mkv')):
-                    cap = cv2.VideoCapture(path)
-                    success, frame = cap.read()
-                    if success:
-                        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        img = Image.fromarray(frame)
-                        img.thumbnail((200, 200))
-                        preview_img = ImageTk.PhotoImage(img)
-                        preview_label.config(image=preview_img)
-                        preview_label.image = preview_img
-                    else:
-                        preview_label.config(image='', text='[No Preview]')
-                    cap.release()
-                else:
-                    preview_label.config(image='', text='[No Preview]')
-            except Exception as e:
-                preview_label.config(image='', text='[Preview Error]')
-
-        def worker():
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-            for url in urls:
-                try:
-                    domain, service, cid = extract_domain_service_id(url)
-                    creator = get_creator_name(domain, service, cid)
-                    save_dir = os.path.join(out, creator)
-                    os.makedirs(save_dir, exist_ok=True)
-                    posts = get_creator_posts(domain, service, cid)
-                    files = []
-                    for post in posts:
-                        files += [f"https://{domain}/data{a['path']}" for a in post.get("attachments", []) if "path" in a]
-                        if post.get("file") and "path" in post["file"]:
-                            files.append(f"https://{domain}/data{post['file']['path']}")
-
-                    artist_bar["value"] = 0
-                    artist_bar["maximum"] = len(files)
-                    log_box.insert(tk.END, f"== {creator} ({len(files)} files) ==\n")
-
-                    def task(url):
-                        # call download_file with preview update after download
-                        file_path = None
-                        try:
-                            file_name = os.path.basename(urlparse(url).path)
-                            subfolder = get_file_type_folder(file_name)
-                            if subfolder is None:
-                                log_box.insert(tk.END, f"[SKIP] {file_name} (unsupported type)\n")
-                                return None
-                            target_folder = os.path.join(save_dir, subfolder)
-                            os.makedirs(target_folder, exist_ok=True)
-                            path = os.path.join(target_folder, file_name)
-                            file_path = path
-                            if os.path.exists(path):
-                                log_box.insert(tk.END, f"[SKIP] {file_name}\n")
-                                return path
-                            headers = {"User-Agent": "Mozilla/5.0"}
-                            r = requests.get(url, stream=True, headers=headers)
-                            total = int(r.headers.get("content-length", 0))
-                            downloaded = 0
-
-                            def update_progress(value):
-                                file_bar["value"] = value
-                            with open(path, 'wb') as f:
-                                for chunk in r.iter_content(8192):
-                                    f.write(chunk)
-                                    downloaded += len(chunk)
-                                    if total:
-                                        percent = int(downloaded * 100 / total)
-                                        root.after_idle(update_progress, percent)
-                            log_box.insert(tk.END, f"[OK] {file_name}\n")
-                            # After download, reset file_bar using after_idle in main thread
-                            root.after_idle(lambda: file_bar.config(value=0))
-                            return path
-                        except Exception as e:
-                            log_box.insert(tk.END, f"[ERROR] {os.path.basename(urlparse(url).path)} — {e}\n")
-                            return None
-
-                    # Use the value from the settings tab for max_workers
-                    with ThreadPoolExecutor(max_workers=worker_count.get()) as executor:
-                        futures = [executor.submit(task, file_url) for file_url in files]
-                        for i, future in enumerate(as_completed(futures)):
-                            result_path = future.result()
-                            # Update artist_bar in main thread using after_idle
-                            root.after_idle(lambda i=i: artist_bar.config(value=i + 1))
-                            # Only update preview if file was successfully downloaded or exists
-                            if result_path and os.path.exists(result_path):
-                                # Use after_idle to update preview in main thread
-                                root.after_idle(update_preview, result_path)
-
-                except Exception as e:
-                    log_box.insert(tk.END, f"[ERROR] {url} — {e}\n")
-
-            file_status.set("Done.")
-
-        threading.Thread(target=worker).start()
+        engine = DownloadEngine(
+            out,
+            workers=worker_count.get(),
+            segments=segment_count.get(),
+            segment_threshold=segment_threshold_mb.get() * 1024 * 1024,
+            sync=sync_only_new.get(),
+            archives=archive_mode.get(),
+            # Engine events arrive on worker threads; the main thread picks them up from the bus
+            on_event=lambda event, data: ui_events.put((event, data)),
+        )
+        threading.Thread(target=engine.run, args=(urls,)).start()
 
     ttk.Button(dl_tab, text="Start Download", command=start_download).pack(pady=(5, 10))
 
@@ -285,8 +1937,9 @@ def start_gui():
 
     search_mode = tk.StringVar(value="kemono")
     search_entry = tk.StringVar()
-    selected_artists = {}
-    artist_lookup = {}
+    # Checked results and results the user unchecked, as (service, id) keys
+    selected_artists = set()
+    unchecked_artists = set()
 
     COOMER_PLATFORMS = ["onlyfans", "fansly", "candfans"]
     KEMONO_PLATFORMS = ["patreon", "fanbox", "discord", "fantia", "afdian", "boosty", "gumroad", "subscribestar", "dlsite"]
@@ -305,6 +1958,9 @@ def start_gui():
     search_frame.pack(padx=10, pady=(0, 10), fill="x")
     search_entry_box = ttk.Entry(search_frame, textvariable=search_entry, width=40)
     search_entry_box.pack(side="left", fill="x", expand=True)
+    post_counts = PostCountFetcher()
+    # A new query makes pending post counts for the old results useless
+    search_entry.trace_add("write", lambda *args: post_counts.cancel_all())
     search_entry_box.bind("<Return>", lambda e: threading.Thread(target=lambda: search_artists(search_entry.get(), search_mode.get())).start())
     ttk.Button(
         search_frame,
@@ -312,86 +1968,139 @@ def start_gui():
         command=lambda: threading.Thread(target=lambda: search_artists(search_entry.get(), search_mode.get())).start()
     ).pack(side="left", padx=5)
 
+    # Virtualized result list: results live in `results` as catalogue row indices and
+    # only the rows in view are drawn on the canvas, so 300k matches cost no widgets
+    results = {"catalogue": None, "rows": [], "top": 0, "error": None, "redraw_pending": False}
     results_canvas = tk.Canvas(browse_tab, bg="#2e2e2e", highlightthickness=0)
-    results_scrollbar = ttk.Scrollbar(browse_tab, orient="vertical", command=results_canvas.yview)
-    results_frame = ttk.Frame(results_canvas)
 
-    results_frame.bind(
-        "<Configure>",
-        lambda e: results_canvas.configure(
-            scrollregion=results_canvas.bbox("all")
-        )
-    )
+    def visible_row_count():
+        return max(1, results_canvas.winfo_height() // RESULT_ROW_HEIGHT)
+
+    def scroll_results_to(top):
+        max_top = max(0, len(results["rows"]) - visible_row_count())
+        results["top"] = min(max(0, int(top)), max_top)
+        draw_results()
+
+    def on_scrollbar(action, *args):
+        if action == "moveto":
+            scroll_results_to(float(args[0]) * len(results["rows"]))
+        elif action == "scroll":
+            step = visible_row_count() if args[1] == "pages" else 1
+            scroll_results_to(results["top"] + int(args[0]) * step)
+
+    results_scrollbar = ttk.Scrollbar(browse_tab, orient="vertical", command=on_scrollbar)
+
+    def result_key(row):
+        catalogue = results["catalogue"]
+        return catalogue.services[row], catalogue.ids[row]
+
+    def draw_results():
+        results["redraw_pending"] = False
+        results_canvas.delete("all")
+        if results["error"]:
+            results_canvas.create_text(5, 5, text=results["error"], anchor="nw", fill="red", font=("Segoe UI", 10))
+            results_scrollbar.set(0, 1)
+            return
+        rows = results["rows"]
+        catalogue = results["catalogue"]
+        top = results["top"]
+        visible = rows[top:top + visible_row_count() + 1]
+        domain = f"{search_mode.get()}.su"
+        for i, row in enumerate(visible):
+            service, uid = result_key(row)
+            count = post_counts.cached(service, uid) or "…"
+            mark = "☑" if (service, uid) in selected_artists else "☐"
+            text = f"{mark}  {catalogue.names[row]} ({service}) - {catalogue.favorited[row]}★ | {count} files"
+            results_canvas.create_text(5, i * RESULT_ROW_HEIGHT + RESULT_ROW_HEIGHT // 2, text=text, anchor="w", fill="white", font=("Segoe UI", 10))
+        if rows:
+            results_scrollbar.set(top / len(rows), min(1.0, (top + visible_row_count()) / len(rows)))
+        else:
+            results_scrollbar.set(0, 1)
+        # Post counts for the rows in view plus a short lookahead
+        for row in rows[top:top + visible_row_count() + POST_COUNT_LOOKAHEAD]:
+            service, uid = result_key(row)
+            if post_counts.cached(service, uid) is None:
+                post_counts.request(domain, service, uid, lambda count: root.after(0, schedule_redraw))
+
+    def schedule_redraw():
+        # Coalesces bursts of post count arrivals into one redraw
+        if not results["redraw_pending"]:
+            results["redraw_pending"] = True
+            root.after_idle(draw_results)
+
+    def on_results_click(event):
+        index = results["top"] + event.y // RESULT_ROW_HEIGHT
+        if results["error"] or index >= len(results["rows"]):
+            return
+        key = result_key(results["rows"][index])
+        if key in selected_artists:
+            selected_artists.discard(key)
+            unchecked_artists.add(key)
+        else:
+            selected_artists.add(key)
+            unchecked_artists.discard(key)
+        draw_results()
+        update_url_box()
+
+    def on_results_wheel(event):
+        if event.num == 4 or event.delta > 0:
+            scroll_results_to(results["top"] - 3)
+        else:
+            scroll_results_to(results["top"] + 3)
 
-    results_canvas.create_window((0, 0), window=results_frame, anchor="nw")
-    results_canvas.configure(yscrollcommand=results_scrollbar.set)
+    results_canvas.bind("<Configure>", lambda e: scroll_results_to(results["top"]))
+    results_canvas.bind("<Button-1>", on_results_click)
+    results_canvas.bind("<MouseWheel>", on_results_wheel)
+    results_canvas.bind("<Button-4>", on_results_wheel)
+    results_canvas.bind("<Button-5>", on_results_wheel)
 
     results_canvas.pack(side="left", fill="both", expand=True, padx=(10,0), pady=(0,10))
     results_scrollbar.pack(side="right", fill="y", pady=(0,10))
 
     def update_url_box():
         existing_urls = set(url_box.get("1.0", "end").strip().splitlines())
-        new_urls = set()
         domain = "kemono.su" if search_mode.get() == "kemono" else "coomer.su"
-        for display, (var, service, uid) in selected_artists.items():
-            if var.get():
-                url = f"https://{domain}/{service}/user/{uid}"
-                new_urls.add(url)
+        new_urls = {f"https://{domain}/{service}/user/{uid}" for service, uid in selected_artists}
         # Fix unchecked URLs domain logic
-        unchecked_urls = {
-            f"https://{domain}/{s}/user/{u}"
-            for display, (var, s, u) in selected_artists.items()
-            if not var.get()
-        }
+        unchecked_urls = {f"https://{domain}/{s}/user/{u}" for s, u in unchecked_artists}
         final_urls = (existing_urls - unchecked_urls) | new_urls
         url_box.delete("1.0", tk.END)
         for url in sorted(final_urls):
             url_box.insert(tk.END, url + "\n")
         url_count_label.config(text=f"URLs: {len(final_urls)}")
 
-    def on_checkbutton_toggle():
-        update_url_box()
+    def show_results(catalogue, rows, error=None):
+        selected_artists.clear()
+        unchecked_artists.clear()
+        results.update(catalogue=catalogue, rows=rows, top=0, error=error)
+        draw_results()
 
     def search_artists(term, mode):
-        for widget in results_frame.winfo_children():
-            widget.destroy()
-        selected_artists.clear()
-        artist_lookup.clear()
+        post_counts.cancel_all()
         term = term.strip().lower()
-        log_box.insert(tk.END, f"Searching '{term}' on {mode}...\n")
+        ui_events.put(("log", {"text": f"Searching '{term}' on {mode}...\n"}))
         selected_mode = search_mode.get()
         selected_platform = search_platform.get().lower()
         try:
-            resp = requests.get(f"https://{selected_mode}.su/api/v1/creators.txt")
-            resp.raise_for_status()
-            all_creators = resp.json()
+            catalogue = load_creator_catalogue(selected_mode)
         except Exception as e:
-            label = tk.Label(results_frame, text=f"[ERROR] Failed to fetch creators.txt — {e}", background="#2e2e2e", foreground="red")
-            label.pack(anchor="w", padx=5, pady=2)
+            root.after(0, show_results, None, [], f"[ERROR] Failed to fetch creators.txt — {e}")
             return
 
-        filtered = []
-        for artist in all_creators:
-            if selected_platform != "any" and artist["service"] != selected_platform:
-                continue
-            if not term or term in artist.get("name", "").lower():
-                filtered.append(artist)
+        rows = catalogue.search(term, None if selected_platform == "any" else selected_platform)
+        # Rows show up immediately; post counts are filled in for the visible ones as they arrive
+        root.after(0, show_results, catalogue, rows)
 
-        filtered.sort(key=lambda a: a.get("favorited", 0), reverse=True)
+    def update_platform_options(*args):
+        options = COOMER_PLATFORMS if search_mode.get() == "coomer" else KEMONO_PLATFORMS
+        menu = platform_menu["menu"]
+        menu.delete(0, "end")
+        menu.add_command(label="Any", command=lambda: search_platform.set("Any"))
+        for opt in options:
+            menu.add_command(label=opt.capitalize(), command=lambda value=opt: search_platform.set(value))
 
-        domain = f"https://{search_mode.get()}.su"
-        for artist in filtered:
-            try:
-                r = requests.get(f"{domain}/api/v1/{artist['service']}/user/{artist['id']}")
-                post_count = len(r.json()) if r.ok else "?"
-            except:
-                post_count = "?"
-            display = f"{artist['name']} ({artist['service']}) - {artist.get('favorited', 0)}★ | {post_count} files"
-            var = tk.BooleanVar()
-            cb = ttk.Checkbutton(results_frame, text=display, variable=var, style="TCheckbutton", command=on_checkbutton_toggle)
-            cb.pack(anchor="w", padx=5, pady=2)
-            selected_artists[display] = (var, artist["service"], artist["id"])
-            artist_lookup[display] = (artist["service"], artist["id"])
+    search_mode.trace_add("write", update_platform_options)
+    update_platform_options()
 
     footer = ttk.Frame(root, padding=5)
     footer.pack(side="bottom", fill="x")
@@ -424,15 +2133,95 @@ def start_gui():
 
     root.mainloop()
 
-if __name__ == "__main__":
+def run_cli(args):
+    urls = list(args.urls)
+    if args.url_file:
+        with open(args.url_file) as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    errors = 0
+    print_lock = threading.Lock()
+
+    def print_event(event, data):
+        nonlocal errors
+        line = json.dumps({"event": event, **data})
+        # One JSON object per line on stdout; events come from many threads
+        with print_lock:
+            if event in ("file_error", "creator_error"):
+                errors += 1
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
+
+    engine = DownloadEngine(
+        os.path.abspath(args.output),
+        workers=args.workers,
+        segments=args.segments,
+        segment_threshold=args.segment_threshold_mb * 1024 * 1024,
+        sync=not args.full,
+        archives=args.archives,
+        on_event=print_event,
+    )
+    if args.metrics_port:
+        serve_metrics(engine.metrics, args.metrics_port, args.metrics_bind)
+    stop_writer = threading.Event()
+    writer = None
+    if args.metrics_file:
+        def write_metrics():
+            # Keeps the text file fresh for scrapers during a long batch sync
+            while not stop_writer.wait(METRICS_WRITE_INTERVAL):
+                engine.metrics.write_prometheus(args.metrics_file)
+        writer = threading.Thread(target=write_metrics, daemon=True)
+        writer.start()
+    sampler = StackSampler() if args.profile else None
+    if sampler:
+        sampler.start()
+    try:
+        engine.run(urls)
+    finally:
+        stop_writer.set()
+        if writer:
+            # The final write below shares the writer's .tmp file, so it must not overlap
+            writer.join()
+        if sampler:
+            sampler.stop()
+            sampler.save(args.profile)
+    if args.metrics_file:
+        engine.metrics.write_prometheus(args.metrics_file)
+    if args.metrics_json:
+        with open(args.metrics_json, "w") as f:
+            json.dump(engine.metrics.report(), f, indent=2)
+    return 1 if errors else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download kemono/coomer creators. Starts the GUI when no URLs are given.")
+    parser.add_argument("urls", nargs="*", help="profile URLs, e.g. https://kemono.su/patreon/user/123")
+    parser.add_argument("-f", "--url-file", help="file with one profile URL per line")
+    parser.add_argument("-o", "--output", default="Output", help="output folder (default: ./Output)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=f"concurrent downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--segments", type=int, default=DEFAULT_SEGMENTS, help=f"ranges per large file (default: {DEFAULT_SEGMENTS})")
+    parser.add_argument("--segment-threshold-mb", type=int, default=DEFAULT_SEGMENT_THRESHOLD_MB,
+                        help=f"segment files larger than this (default: {DEFAULT_SEGMENT_THRESHOLD_MB})")
+    parser.add_argument("--full", action="store_true", help="ignore the sync manifest and list every post")
+    parser.add_argument("--archives", choices=ARCHIVE_MODES, default=ARCHIVE_MODES[0],
+                        help="after verifying a .zip, also write a listing of it or extract it (default: keep)")
+    parser.add_argument("--metrics-json", metavar="PATH", help="write the end-of-run metrics report to PATH")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help=f"keep Prometheus text metrics in PATH, rewritten every {METRICS_WRITE_INTERVAL:g}s")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="serve Prometheus metrics on http://ADDRESS:PORT/metrics")
+    parser.add_argument("--metrics-bind", default="127.0.0.1", metavar="ADDRESS",
+                        help="address the metrics endpoint listens on; 0.0.0.0 lets a remote Prometheus scrape it (default: 127.0.0.1)")
+    parser.add_argument("--profile", metavar="PATH", help="sample thread stacks and write them to PATH in collapsed flame graph format")
+    args = parser.parse_args(argv)
+    args.workers = min(max(args.workers, MIN_WORKERS), MAX_WORKERS)
+    args.segments = min(max(args.segments, MIN_SEGMENTS), MAX_SEGMENTS)
+
+    if args.urls or args.url_file:
+        return run_cli(args)
+    if tk is None:
+        parser.error("tkinter and Pillow are required for the GUI; pass profile URLs to run headless")
     start_gui()
-    def update_platform_options(*args):
-        options = COOMER_PLATFORMS if search_mode.get() == "coomer" else KEMONO_PLATFORMS
-        menu = platform_menu["menu"]
-        menu.delete(0, "end")
-        menu.add_command(label="Any", command=lambda: search_platform.set("Any"))
-        for opt in options:
-            menu.add_command(label=opt.capitalize(), command=lambda value=opt: search_platform.set(value))
+    return 0
 
-    search_mode.trace_add("write", update_platform_options)
-    update_platform_options()
\ No newline at end of file
+if __name__ == "__main__":
+    # Lets the packaged executable act as a verification worker process
+    multiprocessing.freeze_support()
+    sys.exit(main())